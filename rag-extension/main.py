@@ -5,7 +5,9 @@ from fastapi.exceptions import RequestValidationError
 from pydantic import BaseModel, Field, AnyHttpUrl, validator, field_validator
 from typing import Literal, List, Optional, Dict, Any
 import logging
+import os
 import time
+from itertools import count
 import uvicorn
 from contextlib import asynccontextmanager
 from rag import Rag
@@ -19,9 +21,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger("api_service")
 
-# Track request metrics
-request_count = 0
-error_count = 0
+# Track request metrics per worker; next() on a counter is an atomic increment
+request_counter = count()
+error_counter = count()
 
 # Application startup and shutdown events
 @asynccontextmanager
@@ -40,7 +42,9 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("Shutting down RAG API service")
-    logger.info(f"Processed {request_count} requests with {error_count} errors")
+    await rag_object.aclose()
+    # Each counter was advanced once per event, so its next value is the total
+    logger.info(f"Processed {next(request_counter)} requests with {next(error_counter)} errors")
 
 # Initialize FastAPI with lifespan manager
 app = FastAPI(
@@ -95,12 +99,11 @@ class SuccessResponse(BaseModel):
 # Rate limiting middleware
 @app.middleware("http")
 async def add_process_time_header(request: Request, call_next):
-    global request_count
     start_time = time.time()
     response = await call_next(request)
     process_time = time.time() - start_time
     response.headers["X-Process-Time"] = str(process_time)
-    request_count += 1
+    next(request_counter)
     
     # For excessive processing time, log a warning
     if process_time > 5.0:
@@ -111,8 +114,7 @@ async def add_process_time_header(request: Request, call_next):
 # Custom exception handlers
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
-    global error_count
-    error_count += 1
+    next(error_counter)
     return JSONResponse(
         status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
         content={"detail": str(exc)},
@@ -120,8 +122,7 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
 
 @app.exception_handler(Exception)
 async def generic_exception_handler(request: Request, exc: Exception):
-    global error_count
-    error_count += 1
+    next(error_counter)
     logger.error(f"Unhandled exception: {str(exc)}\n{traceback.format_exc()}")
     return JSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -160,7 +161,7 @@ async def get_response(payload: Payload):
         
         # Call RAG system
         start_time = time.time()
-        response = rag_object.response(rag_payload)
+        response = await rag_object.response(rag_payload)
         process_time = time.time() - start_time
         
         # Log processing time
@@ -201,5 +202,8 @@ if __name__ == "__main__":
         host="0.0.0.0", 
         port=8000, 
         reload=False,  # Disable in production
-        log_level="info"
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("rag_workers", 1)),  # Each worker loads its own model and caches
+        log_level="warning"
     )
\ No newline at end of file
@@ -1,25 +1,39 @@
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_groq import ChatGroq
 from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnableBranch, RunnablePassthrough
+from langchain_core.runnables import Runnable, RunnableBranch, RunnablePassthrough
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain_core.prompts import MessagesPlaceholder
 import requests
 import os
 import json
-from bs4 import BeautifulSoup
+import hashlib
+import shutil
+import sqlite3
+import tempfile
+from contextlib import closing
+from selectolax.lexbor import LexborHTMLParser
 import faiss
+import numpy as np
 from langchain_huggingface import HuggingFaceEmbeddings
+from sentence_transformers import SentenceTransformer
 from langchain_community.docstore.in_memory import InMemoryDocstore
 from uuid import uuid4
 import logging
-from typing import List, Dict, Any, Optional
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
 from dotenv import load_dotenv
 import httpx
+import torch
 from pathlib import Path
+from urllib.parse import urlparse
 
 # Configure logging
 logging.basicConfig(
@@ -42,12 +56,126 @@ If the context doesn't contain any relevant information to the question, don't m
 </context>
 """
 
+# Embeddings model configuration
+EMBEDDINGS_MODEL_NAME = "sentence-transformers/all-mpnet-base-v2"
+EMBEDDINGS_BATCH_SIZE = 64
+
+# HNSW index configuration
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+
+# Compressed index configuration for large pages
+IVF_FACTORY = "IVF{nlist},SQ8"
+IVF_MIN_CHUNKS = 2000
+IVF_MIN_POINTS_PER_LIST = 39  # faiss warns below this many training points per centroid
+IVF_NPROBE = 8
+
+# Retrieval and search calibration configuration
+RETRIEVER_K = 3
+SEARCH_CALIBRATION_QUERIES = 100
+SEARCH_TARGET_RECALL = 0.9
+
+# Maximum number of retrieval chains (and their vector stores) kept in memory
+CHAIN_CACHE_SIZE = 32
+CHAIN_LOCK_STRIPES = 64
+
+# Minimum cosine similarity for a past question to reuse its answer
+QUERY_CACHE_THRESHOLD = 0.95
+# Lifetime of cached answers in seconds, and number of URLs whose cache is kept in memory
+QUERY_CACHE_TTL = 3600
+QUERY_CACHE_SIZE = 32
+
+# Shared embeddings model, loaded once per process
+_EMBEDDINGS: Optional[HuggingFaceEmbeddings] = None
+
+
+def get_embeddings() -> HuggingFaceEmbeddings:
+    """
+    Get the process-wide embeddings model, loading it on first use.
+    
+    Runs on GPU in half precision when CUDA is available. On CPU the model is
+    exported to ONNX Runtime, falling back to PyTorch if the export fails. The
+    backend can be forced with the embeddings_backend environment variable.
+    
+    Returns:
+        Shared HuggingFaceEmbeddings instance
+    """
+    global _EMBEDDINGS
+    if _EMBEDDINGS is None:
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        backend = os.getenv("embeddings_backend") or ("torch" if device == "cuda" else "onnx")
+        
+        model_kwargs = {"device": device, "backend": backend}
+        if backend == "torch" and device == "cuda":
+            model_kwargs["model_kwargs"] = {"torch_dtype": torch.float16}
+        encode_kwargs = {"batch_size": EMBEDDINGS_BATCH_SIZE, "normalize_embeddings": True}
+            
+        try:
+            _EMBEDDINGS = HuggingFaceEmbeddings(
+                model_name=EMBEDDINGS_MODEL_NAME,
+                model_kwargs=model_kwargs,
+                encode_kwargs=encode_kwargs
+            )
+        except Exception as e:
+            if backend == "torch":
+                raise
+            logger.warning(f"Failed to load {backend} embeddings backend, using torch: {str(e)}")
+            model_kwargs = {"device": device, "backend": "torch"}
+            _EMBEDDINGS = HuggingFaceEmbeddings(
+                model_name=EMBEDDINGS_MODEL_NAME,
+                model_kwargs=model_kwargs,
+                encode_kwargs=encode_kwargs
+            )
+        logger.info(f"Embeddings model loaded on {device} with {model_kwargs['backend']} backend")
+    return _EMBEDDINGS
+
+
+def parse_html(content: bytes, url: str) -> Document:
+    """
+    Extract text and metadata from an HTML page.
+    
+    Args:
+        content: Raw HTML content
+        url: The URL the content was fetched from
+        
+    Returns:
+        Document with the page text and metadata
+    """
+    tree = LexborHTMLParser(content)
+    
+    # Extract main text content
+    # Remove script and style elements that might contain code
+    tree.strip_tags(["script", "style", "nav", "footer", "header"])
+    
+    # Read the whole document so the title is part of the text, as with get_text()
+    text = tree.root.text(separator='\n', strip=True) if tree.root else ""
+    # Whitespace-only text nodes come back as empty lines, drop them
+    text = "\n".join(line for line in text.splitlines() if line)
+    
+    # Extract metadata
+    metadata = {"source": url}
+    
+    if title := tree.css_first("title"):
+        metadata["title"] = title.text(strip=True)
+        
+    if description := tree.css_first("meta[name=description]"):
+        metadata["description"] = description.attributes.get("content") or "No description found."
+        
+    if html := tree.css_first("html"):
+        metadata["language"] = html.attributes.get("lang") or "en"
+        
+    # Add domain to metadata
+    domain = urlparse(url).netloc
+    metadata["domain"] = domain
+    
+    return Document(page_content=text, metadata=metadata)
+
+
 class Rag:
     def __init__(self):
         """Initialize the RAG system with embeddings model and configuration."""
         self.system_template = SYSTEM_TEMPLATE
-        self.docs = []
-        self.vector_store = None
         
         # Ensure API keys are available
         self.groq_api_key = os.getenv("groq_api_key")
@@ -60,9 +188,39 @@ class Rag:
             logger.warning("HuggingFace_API_KEY not found in environment variables")
             os.environ["HuggingFace_API_KEY"] = self.hf_api_key
         
+        # Build the static parts of the RAG chain once
+        self.llm = None
+        if self.groq_api_key:
+            self.llm = ChatGroq(
+                model='llama-3.1-8b-instant', 
+                api_key=self.groq_api_key,
+                temperature=0.1  # Lower temperature for more factual responses
+            )
+            
+            # Create QA chain
+            question_answering_prompt = ChatPromptTemplate.from_messages([
+                ("system", self.system_template),
+                MessagesPlaceholder(variable_name="message"),
+            ])
+            
+            self.document_chain = create_stuff_documents_chain(self.llm, question_answering_prompt)
+            
+            # Query transformation chain
+            self.query_transform_prompt = ChatPromptTemplate.from_messages([
+                MessagesPlaceholder(variable_name="message"),
+                (
+                    "user",
+                    "Given the above conversation, generate a search query to look up information relevant to the conversation. Only respond with the query, nothing else.",
+                ),
+            ])
+        
         # Initialize embeddings model
         try:
-            self.embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-mpnet-base-v2")
+            self.embeddings = get_embeddings()
+            # Underlying model, used directly for bulk document encoding
+            self.sentence_transformer: SentenceTransformer = self.embeddings._client
+            # Read from the model config, avoiding a probe forward pass
+            self.embedding_dim = self.sentence_transformer.get_sentence_embedding_dimension()
             logger.info("Embeddings model loaded successfully")
         except Exception as e:
             logger.error(f"Failed to load embeddings model: {str(e)}")
@@ -72,8 +230,40 @@ class Rag:
         self.data_dir = Path("data")
         self.data_dir.mkdir(exist_ok=True)
         self.url_file = self.data_dir / "url_mapping.json"
+        
+        # SQLite database shared by all worker processes
+        self.db_file = self.data_dir / "rag.db"
+        self.init_db()
+        # Stores are keyed by content hash now, so per-URL stores are never read again
+        self.remove_legacy_stores()
+        
+        # URL to UUID mappings already read from the database; stored mappings never change
+        self.uuid_by_url: Dict[str, str] = {}
+        
+        # Recently used retrieval chains, most recent last
+        self.chain_cache: OrderedDict[str, Runnable] = OrderedDict()
+        self.chain_cache_lock = threading.Lock()
+        # Fixed pool of build locks, picked by content hash, so it never grows
+        self.chain_locks = [threading.Lock() for _ in range(CHAIN_LOCK_STRIPES)]
+        
+        # Recently used per-URL caches of answered questions, most recent last:
+        # (content hash, query embeddings, answers, creation times)
+        self.query_caches: OrderedDict[str, Tuple[str, faiss.Index, List[str], List[float]]] = OrderedDict()
+        self.query_cache_lock = threading.Lock()
+        
+        # Shared HTTP client, with verification disabled for problematic sites
+        self.http_client = httpx.AsyncClient(
+            timeout=10,
+            verify=False,
+            http2=True,
+            limits=httpx.Limits(max_connections=100)
+        )
 
-    def web_parsing(self, url: str, timeout: int = 10) -> List[Document]:
+    async def aclose(self) -> None:
+        """Release network resources held by the RAG system."""
+        await self.http_client.aclose()
+
+    async def web_parsing(self, url: str, timeout: int = 10) -> List[Document]:
         """
         Parse web content and extract text with metadata.
         
@@ -84,56 +274,30 @@ class Rag:
         Returns:
             List of Document objects with content and metadata
         """
-        self.docs = []  # Reset docs for new request
+        docs = []
         
         try:
             logger.info(f"Fetching content from: {url}")
             
-            # Use httpx with timeout and verification disabled for problematic sites
-            async_client = httpx.AsyncClient(timeout=timeout, verify=False)
-            with httpx.Client(timeout=timeout, verify=False) as client:
-                response = client.get(url, follow_redirects=True)
-                response.raise_for_status()
-                
-            soup = BeautifulSoup(response.content, 'html.parser')
+            response = await self.http_client.get(url, follow_redirects=True, timeout=timeout)
+            response.raise_for_status()
             
-            # Extract main text content
-            # Remove script and style elements that might contain code
-            for script in soup(["script", "style", "nav", "footer", "header"]):
-                script.extract()
-                
-            text = soup.get_text(separator='\n', strip=True)
+            # Parse off the event loop, since HTML extraction is CPU-bound
+            document = await asyncio.to_thread(parse_html, response.content, url)
             
-            # Extract metadata
-            metadata = {"source": url}
+            docs.append(document)
+            logger.info(f"Successfully parsed {url}, extracted {len(document.page_content)} characters")
             
-            if title := soup.find("title"):
-                metadata["title"] = title.get_text(strip=True)
-                
-            if description := soup.find("meta", attrs={"name": "description"}):
-                metadata["description"] = description.get("content", "No description found.")
-                
-            if html := soup.find("html"):
-                metadata["language"] = html.get("lang", "en")
-                
-            # Add domain to metadata
-            from urllib.parse import urlparse
-            domain = urlparse(url).netloc
-            metadata["domain"] = domain
-            
-            self.docs.append(Document(page_content=text, metadata=metadata))
-            logger.info(f"Successfully parsed {url}, extracted {len(text)} characters")
-            
-            return self.docs
+            return docs
             
         except (requests.RequestException, httpx.HTTPError) as e:
             logger.error(f"Error fetching URL {url}: {str(e)}")
             # Return an empty document with error information
-            self.docs.append(Document(
+            docs.append(Document(
                 page_content="Failed to retrieve content from this URL.",
                 metadata={"source": url, "error": str(e)}
             ))
-            return self.docs
+            return docs
 
     def create_embeddings(self, documents: List[Document], uuid: str) -> FAISS:
         """
@@ -156,36 +320,244 @@ class Rag:
                 add_start_index=True
             )
             all_splits = text_splitter.split_documents(documents)
-            logger.info(f"Created {len(all_splits)} text chunks from documents")
             
-            # Initialize FAISS index
-            embedding_dim = len(self.embeddings.embed_query("hello world"))
-            index = faiss.IndexFlatL2(embedding_dim)
+            # Drop repeated chunks such as boilerplate blocks
+            unique_splits = {}
+            for split in all_splits:
+                unique_splits.setdefault(split.page_content, split)
+            all_splits = list(unique_splits.values())
+            logger.info(f"Created {len(all_splits)} unique text chunks from documents")
             
-            self.vector_store = FAISS(
+            # Initialize FAISS index
+            embedding_dim = self.embedding_dim
+            texts = [split.page_content for split in all_splits]
+            metadatas = [split.metadata for split in all_splits]
+            
+            # Embed all chunks straight into a normalized array
+            vectors = self.encode_documents(texts)
+            
+            # Embeddings are normalized, so inner product equals cosine similarity
+            if len(all_splits) > IVF_MIN_CHUNKS:
+                # Compressed index for large pages, trained on the page's own chunks,
+                # with about 4 * sqrt(n) lists and enough training points for each
+                nlist = min(int(4 * np.sqrt(len(vectors))), len(vectors) // IVF_MIN_POINTS_PER_LIST)
+                index_factory = IVF_FACTORY.format(nlist=nlist)
+                index = faiss.index_factory(embedding_dim, index_factory, faiss.METRIC_INNER_PRODUCT)
+                index.train(vectors)
+                logger.info(f"Trained {index_factory} index on {len(vectors)} vectors")
+            else:
+                index = faiss.IndexHNSWFlat(embedding_dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+                index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+                
+            vector_store = FAISS(
                 embedding_function=self.embeddings, 
                 index=index,
                 docstore=InMemoryDocstore(),
-                index_to_docstore_id={}
+                index_to_docstore_id={},
+                distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT
             )
             
             # Generate unique IDs for documents
             uuids = [str(uuid4()) for _ in all_splits]
             
-            # Add documents to vector store
-            self.vector_store.add_documents(all_splits, document_ids=uuids)
+            # Add precomputed vectors to vector store
+            vector_store.add_embeddings(zip(texts, vectors), metadatas=metadatas, ids=uuids)
             
-            # Save vector store
-            storage_path = self.data_dir / uuid
-            self.vector_store.save_local(str(storage_path))
-            logger.info(f"Vector store saved to {storage_path}")
+            # Tune search parameters against exact search on this page
+            search_params = self.calibrate_search(index, vectors)
+            self.configure_search(index, search_params)
             
-            return self.vector_store
+            # Save vector store with its search parameters into a temporary directory,
+            # then move it into place so other processes never see a partial store
+            storage_path = self.data_dir / uuid
+            temp_path = Path(tempfile.mkdtemp(prefix=f".{uuid}-", dir=self.data_dir))
+            try:
+                vector_store.save_local(str(temp_path))
+                with open(temp_path / "search_params.json", "w") as f:
+                    json.dump(search_params, f)
+                os.replace(temp_path, storage_path)
+                logger.info(f"Vector store saved to {storage_path}")
+            except OSError:
+                # Another process finished the same store first; keep theirs
+                if not (storage_path / "index.faiss").exists():
+                    raise
+                logger.info(f"Vector store already saved to {storage_path} by another process")
+            finally:
+                shutil.rmtree(temp_path, ignore_errors=True)
+            
+            return vector_store
             
         except Exception as e:
             logger.error(f"Error creating embeddings: {str(e)}")
             raise
 
+    def encode_documents(self, texts: List[str]) -> np.ndarray:
+        """
+        Encode texts in batches of similar token length to minimize padding.
+        
+        Args:
+            texts: Texts to encode
+            
+        Returns:
+            Normalized float32 embeddings in the same order as texts
+        """
+        lengths = self.sentence_transformer.tokenizer(
+            texts,
+            add_special_tokens=False,
+            truncation=True,
+            max_length=self.sentence_transformer.max_seq_length,
+            return_length=True
+        )["length"]
+        order = np.argsort(lengths, kind="stable")
+        
+        # Writing each batch back to its original positions restores the input order
+        vectors = np.empty((len(texts), self.embedding_dim), dtype="float32")
+        for start in range(0, len(texts), EMBEDDINGS_BATCH_SIZE):
+            batch = order[start:start + EMBEDDINGS_BATCH_SIZE]
+            vectors[batch] = self.sentence_transformer.encode(
+                [texts[i] for i in batch],
+                batch_size=EMBEDDINGS_BATCH_SIZE,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                show_progress_bar=False
+            )
+            
+        return vectors
+
+    def calibrate_search(self, index: faiss.Index, vectors: np.ndarray) -> Dict[str, int]:
+        """
+        Find the cheapest search setting that reaches the target recall.
+        
+        A sample of the indexed vectors is used as queries, with exact search
+        results as ground truth.
+        
+        Args:
+            index: Populated FAISS index, with ids matching rows of vectors
+            vectors: Normalized vectors added to the index
+            
+        Returns:
+            Dictionary with the tuned search parameter, empty if the index has none
+        """
+        if (ivf_index := faiss.try_extract_index_ivf(index)) is not None:
+            name, low, high = "nprobe", 1, ivf_index.nlist
+        elif isinstance(index, faiss.IndexHNSW):
+            name, low, high = "efSearch", RETRIEVER_K, HNSW_EF_CONSTRUCTION
+        else:
+            return {}
+            
+        k = min(RETRIEVER_K, len(vectors))
+        sample_size = min(SEARCH_CALIBRATION_QUERIES, len(vectors))
+        queries = vectors[np.random.default_rng(0).choice(len(vectors), sample_size, replace=False)]
+        
+        exact_index = faiss.IndexFlatIP(vectors.shape[1])
+        exact_index.add(vectors)
+        _, expected_ids = exact_index.search(queries, k)
+        
+        parameter_space = faiss.ParameterSpace()
+        
+        def recall(value: int) -> float:
+            parameter_space.set_index_parameter(index, name, value)
+            _, found_ids = index.search(queries, k)
+            hits = sum(len(set(found) & set(expected)) for found, expected in zip(found_ids, expected_ids))
+            return hits / (sample_size * k)
+            
+        # Recall grows with the parameter, so binary search the smallest passing value
+        while low < high:
+            middle = (low + high) // 2
+            if recall(middle) >= SEARCH_TARGET_RECALL:
+                high = middle
+            else:
+                low = middle + 1
+                
+        # The search settles on the upper bound even when no value passes
+        if (achieved_recall := recall(low)) < SEARCH_TARGET_RECALL:
+            search_params = self.default_search_params(index)
+            logger.warning(
+                f"Recall@{k} only reached {achieved_recall:.2f} at {name}={low}, "
+                f"keeping default {search_params}"
+            )
+            return search_params
+            
+        logger.info(f"Calibrated {name}={low} for Recall@{k} >= {SEARCH_TARGET_RECALL}")
+        return {name: low}
+
+    def default_search_params(self, index: faiss.Index) -> Dict[str, int]:
+        """
+        Get the default search-time parameters for a FAISS index.
+        
+        Args:
+            index: FAISS index to get parameters for
+            
+        Returns:
+            Dictionary of parameter names to values, empty if the index has none
+        """
+        if faiss.try_extract_index_ivf(index) is not None:
+            return {"nprobe": IVF_NPROBE}
+        if isinstance(index, faiss.IndexHNSW):
+            return {"efSearch": HNSW_EF_SEARCH}
+        return {}
+
+    def configure_search(self, index: faiss.Index, search_params: Optional[Dict[str, int]] = None) -> None:
+        """
+        Apply search-time parameters to a built or loaded FAISS index.
+        
+        Args:
+            index: FAISS index to configure
+            search_params: Calibrated parameters, or None to use the defaults
+        """
+        if search_params is None:
+            search_params = self.default_search_params(index)
+            
+        parameter_space = faiss.ParameterSpace()
+        for name, value in search_params.items():
+            parameter_space.set_index_parameter(index, name, value)
+
+    def connect_db(self) -> sqlite3.Connection:
+        """
+        Open a connection to the shared SQLite database.
+        
+        Returns:
+            SQLite connection, to be closed by the caller
+        """
+        return sqlite3.connect(self.db_file, timeout=30)
+
+    def init_db(self) -> None:
+        """Create the database tables and import the legacy URL mapping file."""
+        with closing(self.connect_db()) as connection, connection:
+            # WAL lets readers proceed while another process writes
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS url_mapping (url TEXT PRIMARY KEY, uuid TEXT NOT NULL)"
+            )
+            # Hash of the content each URL served when it was last fetched
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS url_content (uuid TEXT PRIMARY KEY, content_hash TEXT NOT NULL)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS url_content_hash ON url_content (content_hash)"
+            )
+            # Answers to standalone questions, tied to the content they were generated from
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS query_cache ("
+                "uuid TEXT NOT NULL, content_hash TEXT NOT NULL, created_at REAL NOT NULL, "
+                "embedding BLOB NOT NULL, answer TEXT NOT NULL)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS query_cache_uuid ON query_cache (uuid)"
+            )
+            
+            # Legacy mapping stored as {uuid: url}
+            if self.url_file.exists():
+                try:
+                    with open(self.url_file, "r") as f:
+                        legacy_mapping = json.load(f)
+                    connection.executemany(
+                        "INSERT OR IGNORE INTO url_mapping (url, uuid) VALUES (?, ?)",
+                        [(url, uuid) for uuid, url in legacy_mapping.items()]
+                    )
+                except json.JSONDecodeError:
+                    logger.warning(f"Invalid JSON in {self.url_file}, ignoring legacy mapping")
+
     def get_or_create_uuid(self, url: str) -> str:
         """
         Get existing UUID for URL or create a new one.
@@ -196,36 +568,330 @@ class Rag:
         Returns:
             UUID string for the URL
         """
-        # Load existing mappings if available
-        if self.url_file.exists():
-            try:
-                with open(self.url_file, "r") as f:
-                    url_dict = json.load(f)
-            except json.JSONDecodeError:
-                logger.warning(f"Invalid JSON in {self.url_file}, creating new mapping")
-                url_dict = {}
+        if (uuid := self.uuid_by_url.get(url)) is not None:
+            return uuid
+            
+        # The first process to insert a URL wins, every other one reads its UUID
+        with closing(self.connect_db()) as connection, connection:
+            created = connection.execute(
+                "INSERT OR IGNORE INTO url_mapping (url, uuid) VALUES (?, ?)", (url, str(uuid4()))
+            ).rowcount == 1
+            uuid = connection.execute(
+                "SELECT uuid FROM url_mapping WHERE url = ?", (url,)
+            ).fetchone()[0]
+            
+        if created:
+            logger.info(f"Created new UUID {uuid} for {url}")
         else:
-            url_dict = {}
+            logger.info(f"Using existing UUID {uuid} for {url}")
             
-        # Create reverse mapping
-        url_dict_reversed = {v: k for k, v in url_dict.items()}
+        self.uuid_by_url[url] = uuid
+        return uuid
+
+    def load_query_cache(
+        self, uuid: str, embedding_dim: int
+    ) -> Optional[Tuple[str, faiss.Index, List[str], List[float]]]:
+        """
+        Get the answered-question cache for a URL's current content.
         
-        # Use existing UUID or create new one
-        if url in url_dict_reversed:
-            uuid = url_dict_reversed[url]
-            logger.info(f"Using existing UUID {uuid} for {url}")
+        The cache is reloaded from the database when the URL's content has changed
+        since it was loaded, and answers for older content or past their lifetime
+        are deleted. Callers must hold query_cache_lock.
+        
+        Args:
+            uuid: Unique identifier of the URL
+            embedding_dim: Dimension of query embeddings
+            
+        Returns:
+            Tuple of the content hash, query embedding index, answers and their
+            creation times, or None if the URL has not been fetched yet
+        """
+        with closing(self.connect_db()) as connection, connection:
+            row = connection.execute(
+                "SELECT content_hash FROM url_content WHERE uuid = ?", (uuid,)
+            ).fetchone()
+            if row is None:
+                return None
+            content_hash = row[0]
+            
+            cached = self.query_caches.get(uuid)
+            if cached is not None and cached[0] == content_hash:
+                self.query_caches.move_to_end(uuid)
+                return cached
+                
+            connection.execute(
+                "DELETE FROM query_cache WHERE uuid = ? AND (content_hash != ? OR created_at < ?)",
+                (uuid, content_hash, time.time() - QUERY_CACHE_TTL)
+            )
+            rows = connection.execute(
+                "SELECT embedding, answer, created_at FROM query_cache WHERE uuid = ? ORDER BY rowid",
+                (uuid,)
+            ).fetchall()
+            
+        index = faiss.IndexFlatIP(embedding_dim)
+        if rows:
+            index.add(np.stack([np.frombuffer(embedding, dtype="float32") for embedding, _, _ in rows]))
+            
+        cached = (content_hash, index, [answer for _, answer, _ in rows], [created_at for _, _, created_at in rows])
+        self.query_caches[uuid] = cached
+        if len(self.query_caches) > QUERY_CACHE_SIZE:
+            self.query_caches.popitem(last=False)
+            
+        return cached
+
+    def get_cached_answer(self, uuid: str, query_embedding: np.ndarray) -> Optional[str]:
+        """
+        Look up an answer to a previously asked, similar question.
+        
+        Args:
+            uuid: Unique identifier of the URL
+            query_embedding: Normalized embedding of the question
+            
+        Returns:
+            Cached answer, or None if no similar question was answered
+        """
+        with self.query_cache_lock:
+            if (cached := self.load_query_cache(uuid, len(query_embedding))) is None:
+                return None
+                
+            _, index, answers, created_ats = cached
+            if index.ntotal == 0:
+                return None
+                
+            scores, ids = index.search(query_embedding.reshape(1, -1), 1)
+            if scores[0][0] < QUERY_CACHE_THRESHOLD:
+                return None
+                
+            if time.time() - created_ats[ids[0][0]] > QUERY_CACHE_TTL:
+                # Reload without expired answers on the next lookup
+                self.query_caches.pop(uuid, None)
+                return None
+                
+            return answers[ids[0][0]]
+
+    def cache_answer(self, uuid: str, content_hash: str, query_embedding: np.ndarray, answer: str) -> None:
+        """
+        Store an answer for a question about a URL's content.
+        
+        Args:
+            uuid: Unique identifier of the URL
+            content_hash: Hash of the content the answer was generated from
+            query_embedding: Normalized embedding of the question
+            answer: Generated answer
+        """
+        created_at = time.time()
+        with closing(self.connect_db()) as connection, connection:
+            connection.execute(
+                "INSERT INTO query_cache (uuid, content_hash, created_at, embedding, answer) VALUES (?, ?, ?, ?, ?)",
+                (uuid, content_hash, created_at, query_embedding.tobytes(), answer)
+            )
+            
+        # Update the loaded cache in place; otherwise the next load reads the new row
+        with self.query_cache_lock:
+            cached = self.query_caches.get(uuid)
+            if cached is not None and cached[0] == content_hash:
+                cached[1].add(query_embedding.reshape(1, -1))
+                cached[2].append(answer)
+                cached[3].append(created_at)
+
+    def load_vector_store(self, content_hash: str, url: str, documents: List[Document]) -> FAISS:
+        """
+        Load the vector store for page content, creating it from documents if missing.
+        
+        Args:
+            content_hash: Hash of the page content, shared by identical pages
+            url: The URL the documents came from
+            documents: Parsed documents of the URL
+            
+        Returns:
+            FAISS vector store for the content
+        """
+        vector_store_path = self.data_dir / content_hash
+        if (vector_store_path / "index.faiss").exists():
+            logger.info(f"Loading existing vector store from {vector_store_path}")
+            vector_store = FAISS.load_local(
+                str(vector_store_path), 
+                embeddings=self.embeddings, 
+                allow_dangerous_deserialization=True,
+                distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT
+            )
+            
+            # Restore calibrated search parameters if they were saved
+            search_params = None
+            if (search_params_file := vector_store_path / "search_params.json").exists():
+                with open(search_params_file, "r") as f:
+                    search_params = json.load(f)
+            self.configure_search(vector_store.index, search_params)
         else:
-            uuid = str(uuid4())
-            url_dict[uuid] = url
-            logger.info(f"Created new UUID {uuid} for {url}")
+            logger.info(f"Creating new vector store for {url}")
+            vector_store = self.create_embeddings(documents, content_hash)
+            
+        return vector_store
+
+    def build_chain(self, retriever: Runnable) -> Runnable:
+        """
+        Compose the conversational retrieval chain around a retriever.
+        
+        Args:
+            retriever: Retriever returning context documents for a query
+            
+        Returns:
+            Runnable producing the context and answer for a conversation
+        """
+        # Retrieval chain with branching logic
+        query_transforming_retriever_chain = RunnableBranch(
+            (
+                lambda x: len(x.get("message", [])) == 1,
+                (lambda x: x["message"][-1]['content']) | retriever,
+            ),
+            self.query_transform_prompt | self.llm | StrOutputParser() | retriever,
+        ).with_config(run_name="chat_retriever_chain")
+        
+        # Complete RAG chain
+        return (
+            RunnablePassthrough.assign(context=query_transforming_retriever_chain)
+            .assign(answer=self.document_chain)
+        )
+
+    def chain_lock(self, content_hash: str) -> threading.Lock:
+        """
+        Get the lock serializing builds and removals of a content hash's vector store.
+        
+        Args:
+            content_hash: Hash of the page content
+            
+        Returns:
+            Lock shared by every content hash in the same stripe
+        """
+        return self.chain_locks[int(content_hash, 16) % CHAIN_LOCK_STRIPES]
+
+    def remove_vector_store(self, store_name: str) -> None:
+        """
+        Delete a vector store from the data directory, if it exists.
+        
+        Args:
+            store_name: Directory name of the store under the data directory
+        """
+        store_path = self.data_dir / store_name
+        if not store_path.exists():
+            return
+            
+        trash_path = Path(tempfile.mkdtemp(prefix=f".{store_name}-", dir=self.data_dir))
+        try:
+            # Move the store out of the way atomically before deleting it
+            os.replace(store_path, trash_path / store_name)
+        except FileNotFoundError:
+            # Another worker removed it first
+            pass
+        finally:
+            shutil.rmtree(trash_path, ignore_errors=True)
+
+    def remove_legacy_stores(self) -> None:
+        """Delete vector stores left over from when stores were keyed by URL UUID."""
+        with closing(self.connect_db()) as connection:
+            uuids = [row[0] for row in connection.execute("SELECT uuid FROM url_mapping")]
+            
+        for uuid in uuids:
+            if (self.data_dir / uuid).is_dir():
+                logger.info(f"Removing legacy vector store {uuid}")
+                self.remove_vector_store(uuid)
+
+    def is_content_served(self, content_hash: str) -> bool:
+        """
+        Check whether any URL currently serves the given content.
+        
+        Args:
+            content_hash: Hash of the page content
+            
+        Returns:
+            True if at least one URL's current content has this hash
+        """
+        with closing(self.connect_db()) as connection:
+            return connection.execute(
+                "SELECT 1 FROM url_content WHERE content_hash = ? LIMIT 1", (content_hash,)
+            ).fetchone() is not None
+
+    def update_content_hash(self, uuid: str, content_hash: str) -> None:
+        """
+        Record the content a URL currently serves and remove the store it replaces.
+        
+        The previous vector store is deleted once no URL serves its content anymore.
+        
+        Args:
+            uuid: Unique identifier of the URL
+            content_hash: Hash of the content just fetched from the URL
+        """
+        with closing(self.connect_db()) as connection, connection:
+            # Content is usually unchanged, which a plain read confirms without the write lock
+            row = connection.execute(
+                "SELECT content_hash FROM url_content WHERE uuid = ?", (uuid,)
+            ).fetchone()
+            if row is not None and row[0] == content_hash:
+                return
+                
+            # Take the write lock and check again, so the check and update are atomic across processes
+            connection.execute("BEGIN IMMEDIATE")
+            row = connection.execute(
+                "SELECT content_hash FROM url_content WHERE uuid = ?", (uuid,)
+            ).fetchone()
+            previous_hash = row[0] if row else None
+            if previous_hash == content_hash:
+                return
+                
+            connection.execute(
+                "INSERT OR REPLACE INTO url_content (uuid, content_hash) VALUES (?, ?)",
+                (uuid, content_hash)
+            )
+            superseded = previous_hash is not None and connection.execute(
+                "SELECT 1 FROM url_content WHERE content_hash = ? LIMIT 1", (previous_hash,)
+            ).fetchone() is None
+            
+        if not superseded:
+            return
+            
+        logger.info(f"Content of {uuid} changed, removing vector store {previous_hash}")
+        with self.chain_lock(previous_hash):
+            with self.chain_cache_lock:
+                self.chain_cache.pop(previous_hash, None)
+            self.remove_vector_store(previous_hash)
+
+    def get_chain(self, content_hash: str, url: str, documents: List[Document]) -> Runnable:
+        """
+        Get the retrieval chain for page content from memory, or build it from its vector store.
+        
+        Args:
+            content_hash: Hash of the page content, shared by identical pages
+            url: The URL the documents came from
+            documents: Parsed documents of the URL
             
-            # Save updated mappings
-            with open(self.url_file, "w") as f:
-                json.dump(url_dict, f, indent=4)
+        Returns:
+            Conversational retrieval chain for the content
+        """
+        # Serialize building per content so concurrent requests share one vector store
+        with self.chain_lock(content_hash):
+            with self.chain_cache_lock:
+                if (chain := self.chain_cache.get(content_hash)) is not None:
+                    self.chain_cache.move_to_end(content_hash)
+                    return chain
+                    
+            vector_store = self.load_vector_store(content_hash, url, documents)
+            chain = self.build_chain(vector_store.as_retriever(search_kwargs={"k": RETRIEVER_K}))
+            
+            # The URL may have moved on to newer content while this store was built, after
+            # the old content's cleanup already ran; answer from it but don't keep it
+            if not self.is_content_served(content_hash):
+                logger.info(f"Content {content_hash} was superseded, removing its vector store")
+                self.remove_vector_store(content_hash)
+                return chain
                 
-        return uuid
+            with self.chain_cache_lock:
+                self.chain_cache[content_hash] = chain
+                if len(self.chain_cache) > CHAIN_CACHE_SIZE:
+                    self.chain_cache.popitem(last=False)
+                    
+        return chain
 
-    def response(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+    async def response(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         """
         Process user query and generate response using RAG.
         
@@ -248,76 +914,49 @@ class Rag:
                 logger.error("No messages provided in payload")
                 return {"answer": "Error: No messages were provided in the request."}
                 
+            # Get or create UUID for URL
+            uuid = await asyncio.to_thread(self.get_or_create_uuid, url)
+            
+            # Reuse the answer to a near-identical question about the same URL. Only
+            # standalone questions are cached, since follow-ups depend on the conversation
+            query_embedding = None
+            if len(messages) == 1:
+                query_embedding = np.asarray(
+                    await self.embeddings.aembed_query(messages[-1]['content']), dtype="float32"
+                )
+                cached_answer = await asyncio.to_thread(self.get_cached_answer, uuid, query_embedding)
+                if cached_answer is not None:
+                    logger.info(f"Serving cached answer for query from {url}")
+                    return {"answer": cached_answer}
+                
             # Get documents from URL
-            documents = self.web_parsing(url)
+            documents = await self.web_parsing(url)
             if not documents or len(documents[0].page_content) < 100:
                 logger.warning(f"Insufficient content from {url}")
                 return {"answer": "I couldn't extract enough information from the provided URL."}
                 
-            # Get or create UUID for URL
-            uuid = self.get_or_create_uuid(url)
-            
-            # Load or create vector store
-            vector_store_path = self.data_dir / uuid
-            if vector_store_path.exists():
-                logger.info(f"Loading existing vector store from {vector_store_path}")
-                self.vector_store = FAISS.load_local(
-                    str(vector_store_path), 
-                    embeddings=self.embeddings, 
-                    allow_dangerous_deserialization=True
-                )
-            else:
-                logger.info(f"Creating new vector store for {url}")
-                self.vector_store = self.create_embeddings(documents, uuid)
-                
-            # Create retriever
-            retriever = self.vector_store.as_retriever(search_kwargs={"k": 3})
-            
-            # Initialize LLM
-            if not self.groq_api_key:
+            # Ensure the LLM is configured
+            if not self.llm:
                 return {"answer": "Error: GROQ API key is not configured."}
                 
-            llm = ChatGroq(
-                model='llama-3.1-8b-instant', 
-                api_key=self.groq_api_key,
-                temperature=0.1  # Lower temperature for more factual responses
-            )
+            # Identical content shares one vector store, whichever URL it came from
+            content_hash = hashlib.blake2b(
+                "".join(doc.page_content for doc in documents).encode(), digest_size=16
+            ).hexdigest()
             
-            # Create QA chain
-            question_answering_prompt = ChatPromptTemplate.from_messages([
-                ("system", self.system_template),
-                MessagesPlaceholder(variable_name="message"),
-            ])
+            # Drop the store of the URL's previous content, if nothing else uses it
+            await asyncio.to_thread(self.update_content_hash, uuid, content_hash)
             
-            document_chain = create_stuff_documents_chain(llm, question_answering_prompt)
-            
-            # Query transformation chain
-            query_transform_prompt = ChatPromptTemplate.from_messages([
-                MessagesPlaceholder(variable_name="message"),
-                (
-                    "user",
-                    "Given the above conversation, generate a search query to look up information relevant to the conversation. Only respond with the query, nothing else.",
-                ),
-            ])
-            
-            # Retrieval chain with branching logic
-            query_transforming_retriever_chain = RunnableBranch(
-                (
-                    lambda x: len(x.get("message", [])) == 1,
-                    (lambda x: x["message"][-1]['content']) | retriever,
-                ),
-                query_transform_prompt | llm | StrOutputParser() | retriever,
-            ).with_config(run_name="chat_retriever_chain")
-            
-            # Complete RAG chain
-            conversational_retrieval_chain = (
-                RunnablePassthrough.assign(context=query_transforming_retriever_chain)
-                .assign(answer=document_chain)
-            )
+            # Load or build the retrieval chain off the event loop
+            chain = await asyncio.to_thread(self.get_chain, content_hash, url, documents)
             
             # Generate response
             logger.info(f"Generating response for query from {url}")
-            response = conversational_retrieval_chain.invoke({"message": messages})
+            response = await chain.ainvoke({"message": messages})
+            if query_embedding is not None:
+                await asyncio.to_thread(
+                    self.cache_answer, uuid, content_hash, query_embedding, response["answer"]
+                )
             
             return response
             